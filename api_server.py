@@ -0,0 +1,175 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from aiohttp import web
+
+# Import custom modules
+from config import SERP_API_KEY, get_config
+from news_utils import (
+    read_media_list,
+    search_news_for_keywords,
+    build_results_csv,
+    build_results_txt
+)
+
+# Server configuration (Streamlit Secrets or Environment Variables)
+API_HOST = get_config("API_HOST", "0.0.0.0")
+API_PORT = int(get_config("API_PORT", 8080))
+# Number of searches running at the same time (blocking SerpAPI calls run in threads)
+API_MAX_WORKERS = int(get_config("API_MAX_WORKERS", 8))
+# Searches allowed in flight (running + queued) before new ones are rejected with 503
+API_MAX_PENDING = int(get_config("API_MAX_PENDING", 32))
+# End-to-end timeout for a single search request, in seconds
+API_REQUEST_TIMEOUT = float(get_config("API_REQUEST_TIMEOUT", 60))
+MEDIA_FILE = get_config("MEDIA_FILE", "media.txt")
+
+
+def parse_search_params(query):
+    """
+    Validate the search query string parameters.
+    Returns a dict of arguments for search_news_for_keywords or raises ValueError.
+    """
+    keywords = query.get("keywords", "")
+    keywords_list = [k.strip() for k in keywords.split(',') if k.strip()]
+    if not keywords_list:
+        raise ValueError("Please provide at least one keyword (keywords=A,B,...)")
+
+    try:
+        num_results = int(query.get("num_results", 20))
+    except ValueError:
+        raise ValueError("num_results must be an integer")
+    num_results = max(1, min(num_results, 100))
+
+    return {
+        "keywords": keywords,
+        "keywords_list": keywords_list,
+        "num_results": num_results,
+        "start_date_str": query.get("start_date") or None,
+        "end_date_str": query.get("end_date") or None
+    }
+
+
+async def run_search(request, params):
+    """
+    Run a search on the worker pool, applying backpressure and the request timeout.
+    Returns (filtered articles, complete) or raises an aiohttp HTTP error.
+    """
+    app = request.app
+    slots = app["search_slots"]
+    with app["pending_lock"]:
+        if slots["pending"] >= API_MAX_PENDING:
+            raise web.HTTPServiceUnavailable(
+                text="Too many searches in progress, please retry later.",
+                headers={"Retry-After": "5"}
+            )
+        slots["pending"] += 1
+
+    def release(_future):
+        with app["pending_lock"]:
+            slots["pending"] -= 1
+
+    try:
+        executor_future = app["executor"].submit(
+            lambda: search_news_for_keywords(
+                SERP_API_KEY,
+                params["keywords_list"],
+                num_results=params["num_results"],
+                start_date_str=params["start_date_str"],
+                end_date_str=params["end_date_str"],
+                allowed_media=read_media_list(MEDIA_FILE),
+                save_results=False,
+                # Leave some headroom so partial results are returned instead of a 504
+                deadline_seconds=API_REQUEST_TIMEOUT * 0.9
+            )
+        )
+    except Exception:
+        release(None)
+        raise
+    # A timed-out search keeps its worker thread busy: its slot is only released when the
+    # thread finishes (or when it is cancelled before starting)
+    executor_future.add_done_callback(release)
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(executor_future), timeout=API_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise web.HTTPGatewayTimeout(text=f"Search did not complete within {API_REQUEST_TIMEOUT:.0f}s.")
+    except ValueError as e:
+        # Invalid dates are reported by get_news_by_keywords
+        raise web.HTTPBadRequest(text=str(e))
+
+
+async def handle_search(request):
+    try:
+        params = parse_search_params(request.query)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    results, complete = await run_search(request, params)
+    return web.json_response({
+        "keywords": params["keywords_list"],
+        "complete": complete,
+        "count": len(results),
+        "results": results
+    })
+
+
+async def handle_export(request):
+    export_format = request.query.get("format", "csv").lower()
+    if export_format not in ("csv", "txt"):
+        raise web.HTTPBadRequest(text="format must be 'csv' or 'txt'")
+    try:
+        params = parse_search_params(request.query)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    results, complete = await run_search(request, params)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if export_format == "csv":
+        body = build_results_csv(results)
+        content_type = "text/csv"
+    else:
+        body = build_results_txt(results, params["keywords"])
+        content_type = "text/plain"
+
+    return web.Response(
+        text=body,
+        content_type=content_type,
+        charset="utf-8",
+        headers={
+            "Content-Disposition": f'attachment; filename="sosv_news_{timestamp}.{export_format}"',
+            "X-Search-Complete": "true" if complete else "false"
+        }
+    )
+
+
+async def handle_media(request):
+    return web.json_response({"media": sorted(read_media_list(MEDIA_FILE))})
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok", "pending": request.app["search_slots"]["pending"]})
+
+
+async def on_cleanup(app):
+    app["executor"].shutdown(wait=False, cancel_futures=True)
+
+
+def create_app():
+    app = web.Application()
+    app["executor"] = ThreadPoolExecutor(max_workers=API_MAX_WORKERS, thread_name_prefix="search")
+    # Searches submitted to the executor and not finished yet (running or queued).
+    # A mutable dict: the app itself can't be modified once started
+    app["search_slots"] = {"pending": 0}
+    app["pending_lock"] = threading.Lock()
+    app.router.add_get("/search", handle_search)
+    app.router.add_get("/export", handle_export)
+    app.router.add_get("/media", handle_media)
+    app.router.add_get("/health", handle_health)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=API_HOST, port=API_PORT)
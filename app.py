@@ -1,20 +1,24 @@
 import streamlit as st
 import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
 from datetime import datetime, timedelta, date
 import pandas as pd
-import io
-import csv
 
 # Import custom modules
-from config import SERP_API_KEY
+from config import SERP_API_KEY, get_config
 from news_utils import (
-    get_news_by_keywords,
-    sort_articles_by_source_and_date,
-    filter_articles_by_media,
     read_media_list,
-    save_initial_articles_to_csv,
-    save_news_to_txt
+    get_period_dates,
+    search_news_for_keywords,
+    record_cached_search,
+    build_results_csv,
+    build_results_txt
 )
+from cache_warmer import start_cache_warmer
+from search_profiler import SamplingProfiler, build_profile_artifact, save_profile_artifact
 
 # Page configuration
 st.set_page_config(
@@ -24,6 +28,81 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# End-to-end time budget of a search, in seconds (partial results are shown when it expires)
+SEARCH_DEADLINE_SECONDS = float(get_config("SEARCH_DEADLINE_SECONDS", 45))
+
+# Daily off-peak refresh of the most searched keywords (one thread per server process)
+@st.cache_resource
+def start_background_cache_warmer():
+    return start_cache_warmer(SERP_API_KEY, read_media_list("media.txt"))
+
+start_background_cache_warmer()
+
+# Searches kept in memory for all sessions, and for how long (seconds)
+SEARCH_CACHE_SIZE = int(get_config("SEARCH_CACHE_SIZE", 50))
+SEARCH_CACHE_TTL = float(get_config("SEARCH_CACHE_TTL", 900))
+
+@st.cache_resource
+def get_search_cache():
+    """
+    Search artifacts shared by all sessions, least recently used first
+    """
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
+
+def get_cached_search(search_key):
+    cache = get_search_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(search_key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["cached_at"] > SEARCH_CACHE_TTL:
+            del cache["entries"][search_key]
+            return None
+        cache["entries"].move_to_end(search_key)
+        return entry
+
+def put_cached_search(search_key, artifacts):
+    cache = get_search_cache()
+    with cache["lock"]:
+        cache["entries"][search_key] = artifacts
+        cache["entries"].move_to_end(search_key)
+        while len(cache["entries"]) > SEARCH_CACHE_SIZE:
+            cache["entries"].popitem(last=False)
+
+# Profile every search (SEARCH_PROFILING=1), or single searches opened with ?profile=<PROFILE_ADMIN_TOKEN>
+SEARCH_PROFILING = str(get_config("SEARCH_PROFILING", "0")) == "1"
+PROFILE_ADMIN_TOKEN = get_config("PROFILE_ADMIN_TOKEN")
+
+def is_profiling_requested():
+    if SEARCH_PROFILING:
+        return True
+    return bool(PROFILE_ADMIN_TOKEN) and st.query_params.get("profile") == str(PROFILE_ADMIN_TOKEN)
+
+def build_search_artifacts(results, keywords, timestamp, complete):
+    """
+    Everything needed to render a search, built once: export bytes and result cards HTML
+    """
+    # Render all results in a single block for zero container gaps
+    results_html = ""
+    for article in results:
+        results_html += f"""
+            <div class="article-card">
+                <a class="article-title" href="{article['url']}" target="_blank">{article['title']}</a>
+                <div class="article-meta">
+                    {article['source']} • {article['author']} • {article['timestamp']}
+                </div>
+            </div>
+        """
+    return {
+        "count": len(results),
+        "complete": complete,
+        "timestamp": timestamp,
+        "csv": build_results_csv(results).encode("utf-8"),
+        "txt": build_results_txt(results, keywords).encode("utf-8"),
+        "html": results_html,
+        "cached_at": time.monotonic()
+    }
+
 # Modern UI Styling (Light Theme focus)
 st.markdown("""
     <style>
@@ -286,6 +365,16 @@ st.markdown("""
         font-weight: 600;
         font-size: 0.95rem !important;
     }
+    .partial-msg {
+        background-color: #fffbeb;
+        color: #92400e;
+        padding: 0.5rem 1rem !important;
+        border-radius: 6px;
+        margin-bottom: 0.8rem !important;
+        border: 1px solid #fbbf24;
+        font-weight: 600;
+        font-size: 0.95rem !important;
+    }
     </style>
     """, unsafe_allow_html=True)
 
@@ -354,19 +443,7 @@ with st.sidebar:
     selected_period = st.session_state.selected_period
     
     # Calculation happens every rerun
-    default_start = today - timedelta(days=365)
-    default_end = today
-    
-    if selected_period == "Past week":
-        default_start = today - timedelta(days=today.weekday() + 7)
-    elif selected_period == "Past month":
-        first_of_this_month = today.replace(day=1)
-        last_of_prev_month = first_of_this_month - timedelta(days=1)
-        default_start = last_of_prev_month.replace(day=1)
-    elif selected_period == "Past year":
-        default_start = date(today.year - 1, 1, 1)
-    elif selected_period == "YTD":
-        default_start = date(today.year, 1, 1)
+    default_start, default_end = get_period_dates(selected_period, today)
 
     with st.form("search_form", clear_on_submit=False):
         col1, col2 = st.columns(2)
@@ -389,99 +466,97 @@ with st.sidebar:
     except Exception:
         st.sidebar.error("Could not load media list.")
 
+# Results survive reruns (downloads, period buttons...) through session state
 if search_button:
     if not keywords:
         st.error("Please enter at least one keyword.")
+        st.session_state.pop("search_results", None)
     else:
-        with st.spinner("Searching for news articles..."):
-            keywords_list = [k.strip() for k in keywords.split(',') if k.strip()]
-            allowed_media = read_media_list("media.txt")
-            all_filtered_results = []
-            
-            for kw in keywords_list:
-                _, news_list = get_news_by_keywords(
-                    SERP_API_KEY, 
-                    kw, 
-                    num_results=num_results, 
-                    start_date_str=s_date, 
-                    end_date_str=e_date,
-                    allowed_domains=list(allowed_media)
-                )
-                
-                sorted_news = sort_articles_by_source_and_date(news_list)
-                filtered_news = filter_articles_by_media(sorted_news, allowed_media)
-                
-                # Save results to disk
+        keywords_list = [k.strip() for k in keywords.split(',') if k.strip()]
+        allowed_media = read_media_list("media.txt")
+        # The media list is part of the key so a media.txt change isn't served stale results
+        search_key = (keywords, s_date.isoformat(), e_date.isoformat(), num_results, tuple(sorted(allowed_media)))
+        # Profiled searches always run (and are never shared with other sessions)
+        profiling = is_profiling_requested()
+        search_results = None if profiling else get_cached_search(search_key)
+        if search_results is not None:
+            # Served from memory: still count the search for the query planner and cache warmer
+            record_cached_search(keywords_list, num_results)
+        else:
+            with st.spinner("Searching for news articles..."), (SamplingProfiler() if profiling else nullcontext()) as profiler:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                save_initial_articles_to_csv(filtered_news, kw, timestamp, suffix="_filtered")
-                save_news_to_txt(filtered_news, kw, timestamp, suffix="_filtered")
-                
-                all_filtered_results.extend(filtered_news)
-            
-            # Show summary message at the top
-            if all_filtered_results:
-                st.markdown(f'<div class="success-msg">✅ Search complete. {len(all_filtered_results)} filtered articles found.</div>', unsafe_allow_html=True)
-                
-                # --- Download Buttons Section ---
-                col_dl1, col_dl2 = st.columns(2)
-                
-                # Prepare CSV data
-                csv_buffer = io.StringIO()
-                writer = csv.writer(csv_buffer)
-                writer.writerow(["number", "source", "source_url", "date", "author", "title", "url"])
-                for i, article in enumerate(all_filtered_results, 1):
-                    writer.writerow([
-                        i,
-                        article.get('source', ''),
-                        article.get('source_url', ''),
-                        article.get('timestamp', ''),
-                        article.get('author', ''),
-                        article.get('title', ''),
-                        article.get('url', '')
-                    ])
-                
-                col_dl1.download_button(
-                    label="📥 Download Results as CSV",
-                    data=csv_buffer.getvalue(),
-                    file_name=f"sosv_news_{timestamp}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-                
-                # Prepare TXT data
-                txt_buffer = io.StringIO()
-                txt_buffer.write(f"SOSV NEWS SEARCH RESULTS\n")
-                txt_buffer.write("=" * 50 + "\n\n")
-                txt_buffer.write(f"Keywords: {keywords}\n")
-                txt_buffer.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                for i, article in enumerate(all_filtered_results, 1):
-                    txt_buffer.write(f"Article {i}:\n")
-                    txt_buffer.write(f"Title: {article['title']}\n")
-                    txt_buffer.write(f"URL: {article['url']}\n")
-                    txt_buffer.write(f"Source: {article['source']}\n")
-                    txt_buffer.write(f"Author: {article['author']}\n")
-                    txt_buffer.write(f"Date: {article['timestamp']}\n")
-                    txt_buffer.write("-" * 40 + "\n\n")
-                
-                col_dl2.download_button(
-                    label="📥 Download Results as TXT",
-                    data=txt_buffer.getvalue(),
-                    file_name=f"sosv_news_{timestamp}.txt",
-                    mime="text/plain",
-                    use_container_width=True
+
+                # Fetch, sort, filter and save results for every keyword
+                all_filtered_results, search_complete = search_news_for_keywords(
+                    SERP_API_KEY,
+                    keywords_list,
+                    num_results=num_results,
+                    start_date_str=s_date,
+                    end_date_str=e_date,
+                    allowed_media=allowed_media,
+                    timestamp=timestamp,
+                    deadline_seconds=SEARCH_DEADLINE_SECONDS
                 )
-                
-                # Render all results in a single block for zero container gaps
-                results_html = ""
-                for article in all_filtered_results:
-                    results_html += f"""
-                        <div class="article-card">
-                            <a class="article-title" href="{article['url']}" target="_blank">{article['title']}</a>
-                            <div class="article-meta">
-                                {article['source']} • {article['author']} • {article['timestamp']}
-                            </div>
-                        </div>
-                    """
-                st.markdown(results_html, unsafe_allow_html=True)
-            else:
-                st.info("No articles found matching the criteria.")
+                search_results = build_search_artifacts(all_filtered_results, keywords, timestamp, search_complete)
+
+            if profiling:
+                profile_name, profile_data = build_profile_artifact(profiler, {
+                    "keywords": keywords,
+                    "start_date": s_date,
+                    "end_date": e_date,
+                    "num_results": num_results,
+                    "complete": search_complete,
+                    "articles": len(all_filtered_results)
+                })
+                save_profile_artifact(profile_name, profile_data)
+                search_results["profile_name"] = profile_name
+                search_results["profile_data"] = profile_data
+            elif search_complete:
+                # Partial results are not shared: the next search retries the missing keywords
+                put_cached_search(search_key, search_results)
+        st.session_state.search_results = search_results
+
+search_results = st.session_state.get("search_results")
+if search_results:
+    timestamp = search_results["timestamp"]
+
+    if not search_results["complete"]:
+        st.markdown(f'<div class="partial-msg">⏱️ Some queries timed out or failed (time limit {SEARCH_DEADLINE_SECONDS:.0f}s): results are incomplete.</div>', unsafe_allow_html=True)
+    
+    # Show summary message at the top
+    if search_results["count"]:
+        if search_results["complete"]:
+            st.markdown(f'<div class="success-msg">✅ Search complete. {search_results["count"]} filtered articles found.</div>', unsafe_allow_html=True)
+        else:
+            st.markdown(f'<div class="success-msg">{search_results["count"]} filtered articles found (partial).</div>', unsafe_allow_html=True)
+        
+        # --- Download Buttons Section ---
+        col_dl1, col_dl2 = st.columns(2)
+        
+        col_dl1.download_button(
+            label="📥 Download Results as CSV",
+            data=search_results["csv"],
+            file_name=f"sosv_news_{timestamp}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+        
+        col_dl2.download_button(
+            label="📥 Download Results as TXT",
+            data=search_results["txt"],
+            file_name=f"sosv_news_{timestamp}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+        
+        st.markdown(search_results["html"], unsafe_allow_html=True)
+    else:
+        st.info("No articles found matching the criteria.")
+
+    if "profile_data" in search_results:
+        st.download_button(
+            label="🔬 Download Search Profile (folded stacks)",
+            data=search_results["profile_data"],
+            file_name=search_results["profile_name"],
+            mime="application/zip"
+        )
@@ -0,0 +1,164 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import get_config
+from http_client import no_hedging, requests_sent, response_cache
+from news_utils import PERIOD_PRESETS, get_period_dates, plan_search, search_news_for_keywords
+from result_store import get_result_store
+
+# Set to "0" to disable the background warmer
+CACHE_WARM_ENABLED = str(get_config("CACHE_WARM_ENABLED", "1")) == "1"
+# Local hour (0-23) at which the daily refresh runs
+CACHE_WARM_HOUR = int(get_config("CACHE_WARM_HOUR", 5))
+# Number of most frequent searches (keyword sets) to warm
+CACHE_WARM_TOP_SEARCHES = int(get_config("CACHE_WARM_TOP_SEARCHES", 10))
+# Maximum SerpAPI calls per refresh (quota budget), per-keyword fallbacks included
+CACHE_WARM_MAX_CALLS = int(get_config("CACHE_WARM_MAX_CALLS", 40))
+# Only searches from the last N days count towards the top searches
+CACHE_WARM_HISTORY_DAYS = int(get_config("CACHE_WARM_HISTORY_DAYS", 30))
+# Slider default in the app, used for keywords without a recorded num_results
+DEFAULT_NUM_RESULTS = 20
+# Only one process per node runs the warmer: it holds a lock on this file
+CACHE_WARM_LOCK_FILE = get_config("CACHE_WARM_LOCK_FILE", os.path.join(tempfile.gettempdir(), "sosv_news_cache_warmer.lock"))
+
+
+def top_queries(limit=CACHE_WARM_TOP_SEARCHES, history_days=CACHE_WARM_HISTORY_DAYS):
+    """
+    Most frequent searches in the result store history. A search is the full keyword list the
+    user entered, so multi-keyword searches are warmed with the same combined queries the app sends.
+    Returns a list of (keywords_list, num_results), most frequent first.
+    """
+    min_saved_at = time.time() - history_days * 86400
+    search_counts = Counter()
+    seen = set()
+    for search in get_result_store().list_searches():
+        if search.get("saved_at", 0) < min_saved_at:
+            continue
+        # One record is stored per keyword: count each search once
+        keywords = tuple(search.get("keywords") or [search["keyword"]])
+        num_results = search.get("num_results", DEFAULT_NUM_RESULTS)
+        search_key = (search["timestamp"], keywords, num_results)
+        if search_key in seen:
+            continue
+        seen.add(search_key)
+        search_counts[(keywords, num_results)] += 1
+
+    return [(list(keywords), num_results) for (keywords, num_results), _ in search_counts.most_common(limit)]
+
+
+def max_plan_calls(plan):
+    """
+    Most API calls a query plan can send: a combined query returning a full page is followed
+    by one query per keyword (see news_utils.fetch_keyword_batch)
+    """
+    return sum(1 + (len(batch) if len(batch) > 1 else 0) for batch in plan)
+
+
+def warm_cache(api_key, allowed_media, max_calls=CACHE_WARM_MAX_CALLS):
+    """
+    Run the top searches for every period preset so their SerpAPI responses are cached, then
+    share the cached responses with the other processes of the node (see ResponseCache.save_shared).
+    Searches are issued exactly as the app issues them (same keywords, max results and query plan).
+    A search is only started if its plan fits in what is left of max_calls even with every
+    fallback query, and no hedged requests are sent, so max_calls is never exceeded.
+    Returns the number of API calls sent.
+    """
+    queries = top_queries()
+    today = datetime.now().date()
+    sent_before = requests_sent()
+    calls = 0
+    try:
+        with no_hedging():
+            for keywords_list, num_results in queries:
+                for period in PERIOD_PRESETS:
+                    start_date, end_date = get_period_dates(period, today)
+                    plan = plan_search(keywords_list, num_results, start_date, end_date, allowed_media)
+                    if calls + max_plan_calls(plan) > max_calls:
+                        print(f"Cache warmer stopped at its budget of {max_calls} calls")
+                        return calls
+                    search_news_for_keywords(
+                        api_key,
+                        keywords_list,
+                        num_results=num_results,
+                        start_date_str=start_date,
+                        end_date_str=end_date,
+                        allowed_media=allowed_media,
+                        save_results=False
+                    )
+                    # Calls actually sent: cached responses are free, fallback queries are not
+                    calls = requests_sent() - sent_before
+        print(f"Cache warmer refreshed {len(queries)} searches in {calls} calls")
+        return calls
+    finally:
+        shared = response_cache.save_shared()
+        print(f"Cache warmer shared {shared} cached responses")
+
+
+def seconds_until_warm_hour(now=None):
+    """
+    Seconds until the next CACHE_WARM_HOUR (local time)
+    """
+    if now is None:
+        now = datetime.now()
+    next_run = now.replace(hour=CACHE_WARM_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+_warmer_thread = None
+_warmer_lock = threading.Lock()
+# Kept open for the life of the process to hold the node-wide lock
+_warmer_lock_file = None
+
+
+def acquire_warmer_lock():
+    """
+    Take the node-wide warmer lock (released when the process exits).
+    Returns True if this process should run the warmer.
+    """
+    global _warmer_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): each process runs its own warmer
+        return True
+    lock_file = open(CACHE_WARM_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _warmer_lock_file = lock_file
+    return True
+
+
+def start_cache_warmer(api_key, allowed_media):
+    """
+    Start the daily background warmer (once per process, and in one process per node: the other
+    processes read the responses it shares). Returns the thread or None if disabled or running elsewhere.
+    """
+    global _warmer_thread
+    if not CACHE_WARM_ENABLED or not api_key:
+        return None
+
+    def run():
+        while True:
+            time.sleep(seconds_until_warm_hour())
+            try:
+                warm_cache(api_key, allowed_media)
+            except Exception as e:
+                print(f"Cache warmer error: {e}")
+
+    with _warmer_lock:
+        if _warmer_thread is None:
+            if not acquire_warmer_lock():
+                print("Cache warmer already running in another process")
+                return None
+            _warmer_thread = threading.Thread(target=run, name="cache-warmer", daemon=True)
+            _warmer_thread.start()
+        return _warmer_thread
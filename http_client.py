@@ -0,0 +1,267 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+
+import requests
+
+from config import get_config
+from serpapi_cassette import SERPAPI_MODE, get_cassette, request_key, build_response
+
+# Latencies kept to compute the hedging threshold
+LATENCY_WINDOW = 100
+# Minimum number of samples before requests are hedged
+MIN_HEDGE_SAMPLES = 20
+# Never hedge before this delay (seconds), to avoid doubling traffic when latencies are tiny
+MIN_HEDGE_DELAY = 0.5
+
+# Requests in flight at the same time (including hedges and replayed requests)
+SERPAPI_MAX_CONNECTIONS = int(get_config("SERPAPI_MAX_CONNECTIONS", 16))
+
+# Successful responses are reused for identical requests during this many seconds
+# (preset windows end today, so their requests change every day anyway). 0 disables the cache:
+# the default in replay mode, so that every replayed request waits for its recorded latency
+SERPAPI_CACHE_TTL = float(get_config("SERPAPI_CACHE_TTL", 0 if SERPAPI_MODE == "replay" else 24 * 3600))
+SERPAPI_CACHE_SIZE = int(get_config("SERPAPI_CACHE_SIZE", 500))
+# The cache warmer saves the cached responses to this file, read by every process of the node
+# on a cache miss ("" = not shared)
+SERPAPI_SHARED_CACHE = get_config("SERPAPI_SHARED_CACHE", os.path.join(tempfile.gettempdir(), "sosv_news_response_cache.jsonl.gz"))
+
+_executor = ThreadPoolExecutor(max_workers=SERPAPI_MAX_CONNECTIONS, thread_name_prefix="serpapi")
+_thread_stats = threading.local()
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful request latencies (seconds)
+    """
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """
+        Returns the pct percentile of recent latencies, or None if there are too few samples
+        """
+        with self._lock:
+            if len(self._samples) < MIN_HEDGE_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        index = min(int(len(samples) * pct / 100), len(samples) - 1)
+        return samples[index]
+
+
+latency_tracker = LatencyTracker()
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of successful responses (status code and body), with a TTL.
+    save_shared() writes the fresh entries to shared_path; other processes load that file
+    (when it changed) on a cache miss.
+    """
+
+    def __init__(self, ttl=SERPAPI_CACHE_TTL, max_entries=SERPAPI_CACHE_SIZE, shared_path=SERPAPI_SHARED_CACHE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared_path = shared_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared_mtime = None
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        entry = self._get(key)
+        if entry is None and self._load_shared():
+            entry = self._get(key)
+        return entry
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response):
+        if self.ttl <= 0:
+            return
+        self._put(key, {
+            "stored_at": time.time(),
+            "status_code": response.status_code,
+            "content": response.content
+        })
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load_shared(self):
+        """
+        Load the entries of the shared file if it changed since the last load.
+        Returns True if entries were loaded.
+        """
+        if not self.shared_path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.shared_path)
+        except OSError:
+            return False
+        with self._lock:
+            if mtime == self._shared_mtime:
+                return False
+            self._shared_mtime = mtime
+        min_stored_at = time.time() - self.ttl
+        loaded = 0
+        try:
+            with gzip.open(self.shared_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        shared = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if shared["stored_at"] < min_stored_at:
+                        continue
+                    current = self._get(shared["key"])
+                    if current is None or current["stored_at"] < shared["stored_at"]:
+                        self._put(shared["key"], {
+                            "stored_at": shared["stored_at"],
+                            "status_code": shared["status_code"],
+                            "content": shared["body"].encode("utf-8")
+                        })
+                        loaded += 1
+        except (OSError, EOFError) as e:
+            print(f"Error loading shared response cache: {e}")
+        return loaded > 0
+
+    def save_shared(self):
+        """
+        Write the fresh entries to the shared file (replaced atomically). Returns the number of entries written.
+        """
+        if not self.shared_path or self.ttl <= 0:
+            return 0
+        min_stored_at = time.time() - self.ttl
+        with self._lock:
+            entries = [(key, entry) for key, entry in self._entries.items() if entry["stored_at"] >= min_stored_at]
+        folder = os.path.dirname(self.shared_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{self.shared_path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for key, entry in entries:
+                f.write(json.dumps({
+                    "key": key,
+                    "stored_at": entry["stored_at"],
+                    "status_code": entry["status_code"],
+                    "body": entry["content"].decode("utf-8", errors="replace")
+                }, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.shared_path)
+        with self._lock:
+            # Our own entries: no need to load them back
+            self._shared_mtime = os.path.getmtime(self.shared_path)
+        return len(entries)
+
+
+response_cache = ResponseCache()
+
+
+def requests_sent():
+    """
+    Number of requests (hedges included, cache hits excluded) sent by hedged_get in the current thread
+    """
+    return getattr(_thread_stats, "requests_sent", 0)
+
+
+@contextmanager
+def no_hedging():
+    """
+    Don't send hedged requests from the current thread (background jobs don't need the lower latency)
+    """
+    previous = getattr(_thread_stats, "hedging", True)
+    _thread_stats.hedging = False
+    try:
+        yield
+    finally:
+        _thread_stats.hedging = previous
+
+
+def _submit(url, params, timeout):
+    _thread_stats.requests_sent = requests_sent() + 1
+    return _executor.submit(_timed_get, url, params, timeout)
+
+
+def _timed_get(url, params, timeout):
+    start = time.monotonic()
+    if SERPAPI_MODE == "replay":
+        response = get_cassette().replay(url, params, timeout)
+    else:
+        response = requests.get(url, params=params, timeout=timeout)
+        if SERPAPI_MODE == "record":
+            get_cassette().record(url, params, response, time.monotonic() - start)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    latency_tracker.record(time.monotonic() - start)
+    return response
+
+
+def hedged_get(url, params, timeout):
+    """
+    GET a URL with a hard timeout (seconds). If the request is still running after the observed
+    p95 latency, a duplicate request is sent and the first successful response is returned.
+    Successful responses are served from response_cache while fresh.
+    Raises requests.exceptions.RequestException (Timeout when nothing answered in time).
+    """
+    key = request_key(url, params)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return build_response(url, cached["status_code"], cached["content"])
+
+    deadline = time.monotonic() + timeout
+    futures = [_submit(url, params, timeout)]
+
+    hedge_after = None
+    if getattr(_thread_stats, "hedging", True):
+        hedge_after = latency_tracker.percentile(95)
+    if hedge_after is not None:
+        hedge_after = max(hedge_after, MIN_HEDGE_DELAY)
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            print(f"Request slower than p95 ({hedge_after:.1f}s), sending hedged request")
+            futures.append(_submit(url, params, max(deadline - time.monotonic(), 0.1)))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            try:
+                response = future.result()
+                response_cache.put(key, response)
+                return response
+            except requests.exceptions.RequestException as e:
+                error = e
+
+    # Requests still running are left to finish in the background
+    if error is not None and not pending:
+        raise error
+    raise requests.exceptions.Timeout(f"No response within {timeout:.1f}s")
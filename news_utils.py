@@ -2,16 +2,124 @@ import requests
 import json
 import os
 import csv
+import io
+import time
 from datetime import datetime
 from urllib.parse import urlparse
 
-from datetime import datetime, date
+from http_client import hedged_get
+from result_store import get_result_store
+from query_planner import (
+    MAX_COMBINED_RESULTS,
+    window_days,
+    estimate_keyword_volume,
+    build_combined_query,
+    plan_queries,
+    attribute_articles
+)
 
-def get_news_by_keywords(api_key, keywords, num_results=10, start_date_str=None, end_date_str=None, allowed_domains=None):
+from datetime import datetime, date, timedelta
+
+# Use orjson when installed (faster decoding, lower peak memory), stdlib json otherwise.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so error handling is unchanged.
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Timeout of a single SerpAPI request when the search has no (or a longer) deadline
+REQUEST_TIMEOUT = 30
+
+# SerpAPI JSON Restrictor: keep only the news_results fields read by parse_news_results
+NEWS_RESULTS_RESTRICTOR = "news_results[].{title,link,source,date,published_at}"
+
+def parse_news_results(raw_results):
+    """
+    Convert SerpAPI news_results entries into our article dicts.
+    Only the fields we keep are read from each entry.
+    """
+    news_results = []
+    for article in raw_results:
+        # Extract source name
+        # In 'google' engine, source is often just a string name
+        source_raw = article.get("source", "Unknown source")
+        if isinstance(source_raw, dict):
+            source_name = source_raw.get("name", "Unknown source")
+        else:
+            source_name = str(source_raw)
+
+        # Prefer 'published_at' (UTC iso) over 'date' (relative string)
+        # 'date' might be "2 days ago" or "Nov 3, 2023"
+        # 'published_at' is "2023-11-03 07:00:00 UTC"
+        raw_date = article.get("published_at") or article.get("date", "No date available")
+
+        news_results.append({
+            "title": article.get("title", "No title available"),
+            "url": article.get("link", "No URL available"),
+            "source": source_name,
+            # 'google' engine doesn't give an author list in the main snippet
+            "author": "Unknown author",
+            "timestamp": raw_date,
+            # source_url is not provided by the 'google' engine
+            "source_url": ""
+        })
+    return news_results
+
+def build_site_query(allowed_domains):
+    """
+    Build the "site:domain1 OR site:domain2 ..." filter for a list of domains ("" if none)
+    """
+    if not allowed_domains:
+        return ""
+    # Clean domains just in case
+    sites = []
+    for d in allowed_domains:
+        d = d.strip().lower()
+        # remove http/www if present for site operator cleanliness (though google handles them ok usually)
+        if "://" in d:
+            d = d.split("://")[1]
+        if d.startswith("www."):
+            d = d[4:]
+        if d:
+            sites.append(f"site:{d}")
+    return " OR ".join(sites)
+
+class SearchFetchError(Exception):
+    """
+    A SerpAPI query failed (request error, timeout, invalid response or deadline reached)
+    """
+
+# Period presets offered in the app sidebar
+PERIOD_PRESETS = ["Past week", "Past month", "Past year", "YTD"]
+
+def get_period_dates(period, today=None):
+    """
+    Returns (start_date, end_date) for a period preset (defaults to the past 365 days)
+    """
+    if today is None:
+        today = date.today()
+    start = today - timedelta(days=365)
+
+    if period == "Past week":
+        start = today - timedelta(days=today.weekday() + 7)
+    elif period == "Past month":
+        first_of_this_month = today.replace(day=1)
+        last_of_prev_month = first_of_this_month - timedelta(days=1)
+        start = last_of_prev_month.replace(day=1)
+    elif period == "Past year":
+        start = date(today.year - 1, 1, 1)
+    elif period == "YTD":
+        start = date(today.year, 1, 1)
+    return start, today
+
+def get_news_by_keywords(api_key, keywords, num_results=10, start_date_str=None, end_date_str=None, allowed_domains=None, deadline=None, raise_errors=False):
     """
     Fetch news from Google News using SerpAPI for a user-specified date range based on user keywords.
     If allowed_domains is provided, constructs a query to filter by specific sites (site:domain1 OR site:domain2...).
-    Returns (raw_news_results, filtered_results)
+    deadline is an optional time.monotonic() value: the request timeout is capped by the time left.
+    Returns (raw_news_results, filtered_results). Failed queries return ([], []), or raise
+    SearchFetchError if raise_errors is set.
     """
     # If no dates provided, use default: past 6 months
     today_dt = datetime.now()
@@ -61,24 +169,10 @@ def get_news_by_keywords(api_key, keywords, num_results=10, start_date_str=None,
     
     # Construct Query
     final_query = keywords
-    if allowed_domains:
-        # Build "site:domain1 OR site:domain2 ..." string
-        # Clean domains just in case
-        sites = []
-        for d in allowed_domains:
-            d = d.strip().lower()
-            # remove http/www if present for site operator cleanliness (though google handles them ok usually)
-            if "://" in d:
-                d = d.split("://")[1]
-            if d.startswith("www."):
-                d = d[4:]
-            if d:
-                sites.append(f"site:{d}")
-        
-        if sites:
-            site_query = " OR ".join(sites)
-            final_query = f"{keywords} ({site_query})"
-            print(f"Using targeted site query (length {len(final_query)})")
+    site_query = build_site_query(allowed_domains)
+    if site_query:
+        final_query = f"{keywords} ({site_query})"
+        print(f"Using targeted site query (length {len(final_query)})")
 
     # SerpAPI endpoint for Google News
     url = "https://serpapi.com/search"
@@ -92,53 +186,27 @@ def get_news_by_keywords(api_key, keywords, num_results=10, start_date_str=None,
         "num": num_results,
         "hl": "en",
         "gl": "us",
-        "tbs": f"cdr:1,cd_min:{start_date_query},cd_max:{end_date_query}"
+        "tbs": f"cdr:1,cd_min:{start_date_query},cd_max:{end_date_query}",
+        # Only return the fields we use (drops thumbnails, snippets, search metadata...)
+        "json_restrictor": NEWS_RESULTS_RESTRICTOR
     }
     
+    timeout = REQUEST_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            print(f"Search deadline reached, skipping query for {keywords}")
+            if raise_errors:
+                raise SearchFetchError("Search deadline reached")
+            return [], []
+
     try:
-        # Make the API request
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        # Make the API request (hedged when slower than the observed p95 latency)
+        response = hedged_get(url, params, timeout)
         
-        # Parse the JSON response
-        data = response.json()
-        
-        # Extract news results
-        news_results = []
-        
-        if "news_results" in data:
-            for article in data["news_results"]:
-                # Extract source name
-                # In 'google' engine, source is often just a string name
-                source_raw = article.get("source", "Unknown source")
-                if isinstance(source_raw, dict):
-                    source_name = source_raw.get("name", "Unknown source")
-                    # source_url might vary, usually not provided in simple dict
-                    source_url = "" 
-                else:
-                    source_name = str(source_raw)
-                    source_url = ""
-                
-                # 'google' engine often doesn't give specific author list in main snippet
-                # We'll just default to unknown or try to parse if hidden elsewhere
-                author_name = "Unknown author"
-                
-                # Prefer 'published_at' (UTC iso) over 'date' (relative string)
-                # 'date' might be "2 days ago" or "Nov 3, 2023"
-                # 'published_at' is "2023-11-03 07:00:00 UTC"
-                raw_date = article.get("published_at")
-                if not raw_date:
-                    raw_date = article.get("date", "No date available")
-
-                news_item = {
-                    "title": article.get("title", "No title available"),
-                    "url": article.get("link", "No URL available"),
-                    "source": source_name,
-                    "author": author_name,
-                    "timestamp": raw_date,
-                    "source_url": source_url
-                }
-                news_results.append(news_item)
+        # Parse the (restricted) JSON response
+        data = json_loads(response.content)
+        news_results = parse_news_results(data.get("news_results") or [])
         
         # Filter articles by date range after fetching
         filtered_results = []
@@ -156,13 +224,16 @@ def get_news_by_keywords(api_key, keywords, num_results=10, start_date_str=None,
         
     except requests.exceptions.RequestException as e:
         print(f"Error making API request: {e}")
-        return [], []
+        error = e
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON response: {e}")
-        return [], []
+        error = e
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return [], []
+        error = e
+    if raise_errors:
+        raise SearchFetchError(str(error)) from error
+    return [], []
 
 def sort_articles_by_source_and_date(news_list):
     """
@@ -358,3 +429,200 @@ def filter_articles_by_media(news_list, allowed_media_set):
             filtered.append(article)
     print(f"Filtered to {len(filtered)} articles from allowed media domains.")
     return filtered
+
+def fetch_keyword_batch(api_key, keywords_list, num_results=10, start_date_str=None, end_date_str=None, allowed_domains=None, deadline=None):
+    """
+    Fetch the articles of a batch of keywords planned by query_planner.plan_queries.
+    A single keyword is queried as usual; several keywords share one combined OR query and the
+    results are attributed back to each keyword by title.
+    Returns {keyword: {"articles": [articles within the date range],
+                       "raw_count": number of results on the page before date filtering,
+                       "failed": True if the query failed}}
+    """
+    def fetch(query, num):
+        try:
+            raw_results, news_list = get_news_by_keywords(
+                api_key,
+                query,
+                num_results=num,
+                start_date_str=start_date_str,
+                end_date_str=end_date_str,
+                allowed_domains=allowed_domains,
+                deadline=deadline,
+                raise_errors=True
+            )
+            return raw_results, news_list, False
+        except SearchFetchError:
+            return [], [], True
+
+    if len(keywords_list) == 1:
+        raw_results, news_list, failed = fetch(keywords_list[0], num_results)
+        return {keywords_list[0]: {"articles": news_list, "raw_count": len(raw_results), "failed": failed}}
+
+    raw_results, news_list, failed = fetch(build_combined_query(keywords_list), MAX_COMBINED_RESULTS)
+
+    if len(raw_results) >= MAX_COMBINED_RESULTS:
+        # The page is full so some keywords may be missing results: query them separately
+        print(f"Combined query for {keywords_list} returned a full page, querying keywords separately")
+        results = {}
+        for kw in keywords_list:
+            results.update(fetch_keyword_batch(api_key, [kw], num_results, start_date_str, end_date_str, allowed_domains, deadline))
+        return results
+
+    attributed, unmatched = attribute_articles(news_list, keywords_list)
+    if unmatched:
+        print(f"{len(unmatched)} articles from combined query matched no keyword by title")
+    # Per-keyword page size, as if the keyword had been queried on its own
+    raw_attributed, _ = attribute_articles(raw_results, keywords_list)
+    return {
+        kw: {
+            "articles": articles[:num_results],
+            "raw_count": min(len(raw_attributed[kw]), num_results),
+            "failed": failed
+        }
+        for kw, articles in attributed.items()
+    }
+
+def plan_search(keywords_list, num_results=10, start_date_str=None, end_date_str=None, allowed_media=None):
+    """
+    Group the keywords of a search into API calls (see query_planner.plan_queries), from the
+    volumes seen in previous searches. Returns a list of keyword lists, one per API call.
+    """
+    store = get_result_store()
+    days = window_days(start_date_str, end_date_str)
+    estimates = {
+        kw: estimate_keyword_volume(store.recent_searches(kw), num_results, days)
+        for kw in keywords_list
+    }
+    site_query_length = len(build_site_query(sorted(allowed_media or []))) + 3
+    return plan_queries(keywords_list, num_results, estimates, site_query_length)
+
+def search_news_for_keywords(api_key, keywords_list, num_results=10, start_date_str=None, end_date_str=None, allowed_media=None, timestamp=None, save_results=True, deadline_seconds=None):
+    """
+    Run the full search pipeline for each keyword: fetch, sort by source/date, filter by media
+    and (optionally) append the per-keyword results to the result store.
+    Low-volume keywords are fetched together in combined queries (see query_planner).
+    If deadline_seconds is given, the search stops when it expires and keeps the results gathered so far.
+    Returns (filtered articles of all keywords as a single list, complete), complete being False
+    when the deadline expired or any query failed.
+    """
+    if allowed_media is None:
+        allowed_media = set()
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Sorted so identical searches send identical queries (response cache, cassettes)
+    allowed_domains = sorted(allowed_media)
+
+    store = get_result_store()
+    days = window_days(start_date_str, end_date_str)
+    plan = plan_search(keywords_list, num_results, start_date_str, end_date_str, allowed_media)
+    print(f"Query plan: {len(plan)} API calls for {len(keywords_list)} keywords")
+
+    deadline = None
+    if deadline_seconds:
+        deadline = time.monotonic() + deadline_seconds
+
+    # The search is incomplete if the deadline stops it or any query fails (timeout, error...)
+    results_by_keyword = {}
+    complete = True
+    for batch in plan:
+        if deadline is not None and time.monotonic() >= deadline:
+            print(f"Search deadline of {deadline_seconds}s reached, returning partial results")
+            complete = False
+            break
+        batch_results = fetch_keyword_batch(
+            api_key,
+            batch,
+            num_results=num_results,
+            start_date_str=start_date_str,
+            end_date_str=end_date_str,
+            allowed_domains=allowed_domains,
+            deadline=deadline
+        )
+        if any(result["failed"] for result in batch_results.values()):
+            complete = False
+        results_by_keyword.update(batch_results)
+
+    all_filtered_results = []
+    for kw in keywords_list:
+        result = results_by_keyword.get(kw)
+        if result is None:
+            continue
+        sorted_news = sort_articles_by_source_and_date(result["articles"])
+        filtered_news = filter_articles_by_media(sorted_news, allowed_media)
+
+        # Keywords cut by the deadline or whose query failed are not stored
+        # (their volume would look too low to the query planner)
+        if save_results and not result["failed"]:
+            # The store also writes the per-search CSV/TXT views (removed with the search by retention)
+            store.append_search(kw, filtered_news, timestamp, meta={
+                "num_results": num_results,
+                "window_days": days,
+                # All keywords of the search, so the cache warmer can replay the same plan
+                "keywords": keywords_list,
+                "raw_count": result["raw_count"]
+            })
+
+        all_filtered_results.extend(filtered_news)
+
+    return all_filtered_results, complete
+
+def record_cached_search(keywords_list, num_results=10, timestamp=None):
+    """
+    Record a search served from a cache in the result store history (without articles), so it
+    still counts for the query planner and the cache warmer.
+    Volumes are copied from the latest stored search of each keyword; keywords without one are skipped.
+    """
+    store = get_result_store()
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for kw in keywords_list:
+        recent = store.recent_searches(kw)
+        if not recent or "raw_count" not in recent[-1]:
+            continue
+        latest = recent[-1]
+        store.append_search(kw, [], timestamp, meta={
+            "num_results": latest.get("num_results", num_results),
+            "window_days": latest.get("window_days"),
+            "raw_count": latest["raw_count"],
+            "keywords": keywords_list,
+            "cache_hit": True
+        }, write_views=False)
+
+def build_results_csv(news_list):
+    """
+    Build the CSV export of a result list as a string (same columns as save_initial_articles_to_csv)
+    """
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerow(["number", "source", "source_url", "date", "author", "title", "url"])
+    for i, article in enumerate(news_list, 1):
+        writer.writerow([
+            i,
+            article.get('source', ''),
+            article.get('source_url', ''),
+            article.get('timestamp', ''),
+            article.get('author', ''),
+            article.get('title', ''),
+            article.get('url', '')
+        ])
+    return csv_buffer.getvalue()
+
+def build_results_txt(news_list, keywords):
+    """
+    Build the TXT export of a result list as a string
+    """
+    txt_buffer = io.StringIO()
+    txt_buffer.write(f"SOSV NEWS SEARCH RESULTS\n")
+    txt_buffer.write("=" * 50 + "\n\n")
+    txt_buffer.write(f"Keywords: {keywords}\n")
+    txt_buffer.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    for i, article in enumerate(news_list, 1):
+        txt_buffer.write(f"Article {i}:\n")
+        txt_buffer.write(f"Title: {article['title']}\n")
+        txt_buffer.write(f"URL: {article['url']}\n")
+        txt_buffer.write(f"Source: {article['source']}\n")
+        txt_buffer.write(f"Author: {article['author']}\n")
+        txt_buffer.write(f"Date: {article['timestamp']}\n")
+        txt_buffer.write("-" * 40 + "\n\n")
+    return txt_buffer.getvalue()
@@ -0,0 +1,133 @@
+import re
+from datetime import date, datetime
+
+# Largest page SerpAPI returns for one Google News query: a combined query asks for this many
+MAX_COMBINED_RESULTS = 100
+# Upper bound on the query string sent to Google (keywords + site filter)
+MAX_QUERY_LENGTH = 2048
+# Window used by get_news_by_keywords when no dates are given (~6 months)
+DEFAULT_WINDOW_DAYS = 183
+
+
+def window_days(start_date, end_date):
+    """
+    Length in days of a search window given as date objects or YYYY-MM-DD strings
+    """
+    def to_date(d):
+        if isinstance(d, datetime):
+            return d.date()
+        if isinstance(d, date):
+            return d
+        try:
+            return date.fromisoformat(str(d).strip())
+        except ValueError:
+            return None
+
+    if not start_date or not end_date:
+        return DEFAULT_WINDOW_DAYS
+    start, end = to_date(start_date), to_date(end_date)
+    if start is None or end is None:
+        return DEFAULT_WINDOW_DAYS
+    return max((end - start).days + 1, 1)
+
+
+def estimate_keyword_volume(recent_searches, num_results, days):
+    """
+    Estimate how many articles a keyword returns for a window of `days` days,
+    from the metadata of its recent searches (see ResultStore.recent_searches).
+    Returns None when the keyword is known to fill its whole result page (high volume).
+    Keywords without history are assumed to fill num_results.
+    """
+    if not recent_searches:
+        return num_results
+
+    estimate = 0
+    for search in recent_searches:
+        # raw_count is the size of the result page, before date and media filtering
+        count = search.get("raw_count", search.get("count", 0))
+        requested = search.get("num_results")
+        if requested and count >= requested:
+            # The page was full: the real volume is unknown, keep the keyword on its own
+            return None
+        past_days = search.get("window_days") or DEFAULT_WINDOW_DAYS
+        estimate = max(estimate, count * days / past_days)
+    return min(int(estimate + 0.999), num_results)
+
+
+def build_combined_query(keywords_list):
+    """
+    Build a single OR query for several keywords: ("A" OR "B" OR "C")
+    """
+    quoted = ['"{}"'.format(kw.replace('"', '')) for kw in keywords_list]
+    return "(" + " OR ".join(quoted) + ")"
+
+
+def plan_queries(keywords_list, num_results, estimates, site_query_length=0):
+    """
+    Group keywords into API calls.
+    High-volume keywords (estimate None or >= num_results) get their own call; the others are
+    packed (largest first) into combined queries whose estimated volume fits in one result page
+    and whose text fits in MAX_QUERY_LENGTH.
+    Returns a list of keyword lists, one per API call.
+    """
+    plan = []
+    low_volume = []
+    for kw in keywords_list:
+        estimate = estimates.get(kw)
+        if estimate is None or estimate >= num_results:
+            plan.append([kw])
+        else:
+            low_volume.append(kw)
+
+    batches = []
+    for kw in sorted(low_volume, key=lambda k: -estimates[k]):
+        for batch in batches:
+            volume = sum(estimates[k] for k in batch["keywords"]) + estimates[kw]
+            query_length = len(build_combined_query(batch["keywords"] + [kw])) + site_query_length
+            if volume <= MAX_COMBINED_RESULTS and query_length <= MAX_QUERY_LENGTH:
+                batch["keywords"].append(kw)
+                break
+        else:
+            batches.append({"keywords": [kw]})
+
+    plan.extend(batch["keywords"] for batch in batches)
+    # Keep the user's keyword order within and across calls
+    order = {kw: i for i, kw in enumerate(keywords_list)}
+    for keywords in plan:
+        keywords.sort(key=order.get)
+    plan.sort(key=lambda keywords: order[keywords[0]])
+    return plan
+
+
+def keyword_matches(keyword, title):
+    """
+    True if the title contains the keyword phrase, or all of its words, as whole words
+    """
+    title = title.lower()
+    keyword = keyword.lower().strip()
+    words = re.findall(r"\w+", keyword)
+    if not words:
+        return False
+    # Whole words only: "AI" must not match "Brain", nor "Ola" match "Coca-Cola"
+    if re.search(r"\b" + re.escape(keyword) + r"\b", title):
+        return True
+    return all(re.search(r"\b" + re.escape(w) + r"\b", title) for w in words)
+
+
+def attribute_articles(news_list, keywords_list):
+    """
+    Split the results of a combined query back per keyword by matching the article titles.
+    An article matching several keywords is attributed to each of them.
+    Returns {keyword: [articles]} and the list of articles that matched no keyword.
+    """
+    attributed = {kw: [] for kw in keywords_list}
+    unmatched = []
+    for article in news_list:
+        matched = False
+        for kw in keywords_list:
+            if keyword_matches(kw, article.get('title', '')):
+                attributed[kw].append(article)
+                matched = True
+        if not matched:
+            unmatched.append(article)
+    return attributed, unmatched
@@ -0,0 +1,517 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import get_config
+
+# Store location and limits (Streamlit Secrets or Environment Variables)
+RESULT_STORE_FOLDER = get_config("RESULT_STORE_FOLDER", os.path.join("result", "store"))
+# A segment is sealed (and a new one started) once it grows past this size
+RESULT_STORE_SEGMENT_BYTES = int(get_config("RESULT_STORE_SEGMENT_BYTES", 4 * 1024 * 1024))
+# Searches older than this are dropped (0 = keep forever)
+RESULT_STORE_MAX_AGE_DAYS = float(get_config("RESULT_STORE_MAX_AGE_DAYS", 90))
+# Oldest searches are dropped once the segments and views exceed this size (0 = no limit)
+RESULT_STORE_MAX_BYTES = int(get_config("RESULT_STORE_MAX_BYTES", 256 * 1024 * 1024))
+# Folder of the per-search CSV/TXT views ("" = don't write them)
+RESULT_STORE_VIEWS_FOLDER = get_config("RESULT_STORE_VIEWS_FOLDER", "result")
+
+MANIFEST_NAME = "manifest.json"
+# Held (flock) by the process reading or writing the manifest and segments
+LOCK_NAME = "store.lock"
+# Searches per keyword kept in memory for recent_searches()
+KEYWORD_HISTORY_SIZE = 5
+# Size retention trims the store down to this fraction of max_total_bytes, so that
+# compaction doesn't run again after every new segment
+SIZE_RETENTION_TARGET = 0.8
+
+
+def article_id(article):
+    """
+    Content hash of an article, used to store identical articles only once
+    """
+    payload = json.dumps(article, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Append-only store for search results.
+
+    Records are JSON lines appended to size-bounded segment files listed in manifest.json.
+    Two record types exist:
+    - {"type": "article", "id": ..., "article": {...}}: written once per distinct article
+    - {"type": "search", "search_id": ..., "keyword": ..., "timestamp": ..., "saved_at": ..., "ids": [...]}
+
+    When the active segment is full it is sealed and a new one is started. The store is compacted
+    in a background thread (searches outside the retention limits dropped, only the articles they
+    still reference kept) when it is opened or written to and either its oldest search is past
+    max_age_days or its segments and views exceed max_total_bytes.
+
+    Each stored search also has CSV/TXT views in views_folder, counted in its size and removed with it.
+
+    Several processes (the app, the API server) can share a store: every read-modify-write of the
+    manifest and segments holds a file lock, and the manifest is reloaded under that lock when
+    another process changed it.
+    """
+
+    def __init__(self, folder=RESULT_STORE_FOLDER, segment_max_bytes=RESULT_STORE_SEGMENT_BYTES,
+                 max_age_days=RESULT_STORE_MAX_AGE_DAYS, max_total_bytes=RESULT_STORE_MAX_BYTES,
+                 views_folder=RESULT_STORE_VIEWS_FOLDER):
+        self.folder = folder
+        self.segment_max_bytes = segment_max_bytes
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.views_folder = views_folder
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._known_ids = None
+        self._keyword_index = None
+        self._compaction_thread = None
+        os.makedirs(self.folder, exist_ok=True)
+        self.manifest = self._load_manifest()
+        with self._locked():
+            needs_compaction = self._needs_compaction()
+        if needs_compaction:
+            self.start_compaction()
+
+    # --- Locking ---
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the store lock (thread lock + file lock shared with other processes) and make sure
+        self.manifest is the latest one on disk. Reentrant.
+        """
+        with self._lock:
+            self._lock_depth += 1
+            lock_file = None
+            try:
+                if self._lock_depth == 1:
+                    lock_file = self._lock_file()
+                    self._reload_manifest()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if lock_file is not None:
+                    lock_file.close()  # Releases the flock
+
+    def _lock_file(self):
+        lock_file = open(os.path.join(self.folder, LOCK_NAME), 'a')
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): only threads of this process are serialized
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except Exception:
+            lock_file.close()
+            raise
+        return lock_file
+
+    def _reload_manifest(self):
+        manifest = self._load_manifest()
+        if manifest.get("version", 0) != self.manifest.get("version", 0):
+            # Another process appended or compacted: the in-memory index is stale
+            self.manifest = manifest
+            self._known_ids = None
+            self._keyword_index = None
+
+    # --- Manifest ---
+
+    def _manifest_path(self):
+        return os.path.join(self.folder, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"next_segment": 1, "segments": []}
+
+    def _save_manifest(self):
+        self.manifest["version"] = self.manifest.get("version", 0) + 1
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _segment_path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _new_segment(self):
+        name = f"segment_{self.manifest['next_segment']:06d}.jsonl"
+        self.manifest["next_segment"] += 1
+        segment = {"name": name, "created_at": time.time(), "size": 0, "records": 0, "sealed": False}
+        self.manifest["segments"].append(segment)
+        return segment
+
+    def _active_segment(self):
+        segments = self.manifest["segments"]
+        if segments and not segments[-1]["sealed"]:
+            return segments[-1]
+        return self._new_segment()
+
+    # --- Reading ---
+
+    def _iter_segment(self, name):
+        try:
+            with open(self._segment_path(name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partial line from an interrupted write
+                        continue
+        except FileNotFoundError:
+            return
+
+    def iter_records(self):
+        with self._locked():
+            names = [s["name"] for s in self.manifest["segments"]]
+        for name in names:
+            yield from self._iter_segment(name)
+
+    def _ensure_index(self):
+        if self._known_ids is None:
+            self._known_ids = set()
+            self._keyword_index = {}
+            for record in self.iter_records():
+                if record.get("type") == "article":
+                    self._known_ids.add(record["id"])
+                elif record.get("type") == "search":
+                    self._index_search(record)
+
+    def _index_search(self, record):
+        meta = {k: v for k, v in record.items() if k not in ("type", "ids")}
+        meta["count"] = len(record["ids"])
+        recent = self._keyword_index.setdefault(record["keyword"].lower(), [])
+        recent.append(meta)
+        del recent[:-KEYWORD_HISTORY_SIZE]
+
+    def recent_searches(self, keyword):
+        """
+        Returns the metadata of the latest stored searches for a keyword (oldest first)
+        """
+        with self._locked():
+            self._ensure_index()
+            return list(self._keyword_index.get(keyword.lower(), []))
+
+    def list_searches(self):
+        """
+        Returns the search records (without article ids), oldest first
+        """
+        searches = []
+        # Locked throughout so that another process can't compact the segments being read
+        with self._locked():
+            for record in self.iter_records():
+                if record.get("type") == "search":
+                    meta = dict(record)
+                    meta["count"] = len(meta.pop("ids", []))
+                    searches.append(meta)
+        return searches
+
+    def get_search(self, search_id):
+        """
+        Returns (search_record, articles) for a search id, or (None, []) if unknown
+        """
+        search = None
+        articles = {}
+        with self._locked():
+            for record in self.iter_records():
+                if record.get("type") == "article":
+                    articles[record["id"]] = record["article"]
+                elif record.get("type") == "search" and record["search_id"] == search_id:
+                    search = record
+        if search is None:
+            return None, []
+        return search, [articles[i] for i in search["ids"] if i in articles]
+
+    # --- Writing ---
+
+    def _write_records(self, segment, records):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(self._segment_path(segment["name"]), 'a', encoding='utf-8') as f:
+            f.write(data)
+        segment["size"] += len(data.encode("utf-8"))
+        segment["records"] += len(records)
+        if segment["size"] >= self.segment_max_bytes:
+            segment["sealed"] = True
+
+    def _append(self, records):
+        segment = self._active_segment()
+        self._write_records(segment, records)
+        self._save_manifest()
+        return segment["sealed"]
+
+    def append_search(self, keyword, news_list, timestamp=None, meta=None, write_views=True):
+        """
+        Append the results of one keyword search. Articles already in the store are not rewritten.
+        meta holds extra search parameters to keep with the search record (num_results, dates...).
+        write_views=False skips the CSV/TXT views (e.g. history-only records).
+        Returns the search id.
+        """
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_keywords = keyword.replace(' ', '_')
+        search_id = f"{timestamp}_{safe_keywords}"
+
+        views_bytes = 0
+        if write_views and self.views_folder:
+            for path in self._write_views(keyword, timestamp, news_list, self.views_folder):
+                if path:
+                    views_bytes += os.path.getsize(path)
+
+        with self._locked():
+            self._ensure_index()
+            records = []
+            ids = []
+            for article in news_list:
+                a_id = article_id(article)
+                ids.append(a_id)
+                if a_id not in self._known_ids:
+                    self._known_ids.add(a_id)
+                    records.append({"type": "article", "id": a_id, "article": article})
+            search = dict(meta or {})
+            search.update({
+                "type": "search",
+                "search_id": search_id,
+                "keyword": keyword,
+                "timestamp": timestamp,
+                "saved_at": time.time(),
+                "ids": ids
+            })
+            if views_bytes:
+                search["views_bytes"] = views_bytes
+                self.manifest["views_bytes"] = self.manifest.get("views_bytes", 0) + views_bytes
+            if self.manifest.get("oldest_saved_at") is None:
+                self.manifest["oldest_saved_at"] = search["saved_at"]
+            records.append(search)
+            self._index_search(search)
+            self._append(records)
+            needs_compaction = self._needs_compaction()
+
+        if needs_compaction:
+            self.start_compaction()
+        print(f"Stored {len(news_list)} articles for '{keyword}' ({len(records) - 1} new)")
+        return search_id
+
+    # --- Compaction and retention ---
+
+    def _needs_compaction(self):
+        """
+        True when a retention limit is exceeded (cheap: only reads the manifest)
+        """
+        oldest_saved_at = self.manifest.get("oldest_saved_at")
+        if self.max_age_days and oldest_saved_at is not None:
+            if oldest_saved_at < time.time() - self.max_age_days * 86400:
+                return True
+        if self.max_total_bytes:
+            if self._total_bytes() > self.max_total_bytes:
+                return True
+        return False
+
+    def _total_bytes(self):
+        """
+        Size of the segments and of the CSV/TXT views
+        """
+        return sum(s["size"] for s in self.manifest["segments"]) + self.manifest.get("views_bytes", 0)
+
+    def start_compaction(self):
+        """
+        Compact in a background thread (at most one at a time), so that searches aren't delayed.
+        Returns the thread, or None if a compaction is already running.
+        """
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return None
+            self._compaction_thread = threading.Thread(target=self.compact, name="result-store-compaction", daemon=True)
+            self._compaction_thread.start()
+            return self._compaction_thread
+
+    def compact(self):
+        """
+        Rewrite all segments into new ones, keeping only searches within the retention limits
+        and the articles they reference (each stored once).
+
+        The store is only locked to seal the current segments and to swap in the new ones: searches
+        appended meanwhile go to new segments, kept after the compacted ones. Returns False if
+        another process compacted the store in the meantime (this compaction is then discarded).
+        """
+        with self._locked():
+            segments = self.manifest["segments"]
+            if segments and not segments[-1]["sealed"]:
+                segments[-1]["sealed"] = True
+            old_names = [s["name"] for s in segments]
+            compaction_number = self.manifest["next_segment"]
+            self.manifest["next_segment"] += 1
+            self._save_manifest()
+
+        # Sealed segments are never written again: read them without holding the lock
+        articles = {}
+        all_searches = []
+        for name in old_names:
+            for record in self._iter_segment(name):
+                if record.get("type") == "article":
+                    articles[record["id"]] = record["article"]
+                elif record.get("type") == "search":
+                    all_searches.append(record)
+        searches = all_searches
+
+        # Retention by age
+        if self.max_age_days:
+            min_saved_at = time.time() - self.max_age_days * 86400
+            searches = [s for s in searches if s.get("saved_at", 0) >= min_saved_at]
+
+        # Retention by size: keep the newest searches that fit in the target size
+        if self.max_total_bytes:
+            target = self.max_total_bytes * SIZE_RETENTION_TARGET
+            total = 0
+            counted = set()
+            kept = []
+            for search in reversed(searches):
+                size = len(json.dumps(search, ensure_ascii=False)) + search.get("views_bytes", 0)
+                new_ids = set(i for i in search["ids"] if i in articles and i not in counted)
+                size += sum(len(json.dumps(articles[i], ensure_ascii=False)) + 70 for i in new_ids)
+                if total + size > target:
+                    break
+                total += size
+                counted.update(new_ids)
+                kept.append(search)
+            searches = list(reversed(kept))
+
+        kept_ids = set(s["search_id"] for s in searches)
+        dropped = [s for s in all_searches if s["search_id"] not in kept_ids]
+
+        new_segments = []
+        written = set()
+
+        def write(records):
+            if not new_segments or new_segments[-1]["sealed"]:
+                name = f"segment_{compaction_number:06d}_{len(new_segments) + 1:03d}.jsonl"
+                new_segments.append({"name": name, "created_at": time.time(), "size": 0, "records": 0, "sealed": False})
+            self._write_records(new_segments[-1], records)
+
+        def article_records(ids):
+            records = []
+            for a_id in ids:
+                if a_id in articles and a_id not in written:
+                    written.add(a_id)
+                    records.append({"type": "article", "id": a_id, "article": articles[a_id]})
+            return records
+
+        for search in searches:
+            write(article_records(search["ids"]) + [search])
+
+        with self._locked():
+            names = [s["name"] for s in self.manifest["segments"]]
+            if names[:len(old_names)] != old_names:
+                print("Result store was compacted by another process, discarding this compaction")
+                for segment in new_segments:
+                    self._remove_file(self._segment_path(segment["name"]))
+                return False
+
+            # Searches appended during the compaction may reference articles only stored in the
+            # old segments (they were known, so not rewritten): keep those articles too
+            tail = self.manifest["segments"][len(old_names):]
+            tail_searches = []
+            tail_article_ids = set()
+            for segment in tail:
+                for record in self._iter_segment(segment["name"]):
+                    if record.get("type") == "article":
+                        tail_article_ids.add(record["id"])
+                    elif record.get("type") == "search":
+                        tail_searches.append(record)
+            missing = [i for s in tail_searches for i in s["ids"] if i not in tail_article_ids]
+            records = article_records(missing)
+            if records:
+                write(records)
+
+            all_kept = searches + tail_searches
+            self.manifest["segments"] = new_segments + tail
+            self.manifest["oldest_saved_at"] = min((s.get("saved_at", 0) for s in all_kept), default=None)
+            self.manifest["views_bytes"] = sum(s.get("views_bytes", 0) for s in all_kept)
+            # Old segments are only removed once the manifest points at the new ones
+            self._save_manifest()
+            for name in old_names:
+                self._remove_file(self._segment_path(name))
+
+            if self.views_folder:
+                for search in dropped:
+                    self._remove_views(search["keyword"], search["timestamp"], self.views_folder)
+
+            # Rebuilt from the new segments on next use
+            self._known_ids = None
+            self._keyword_index = None
+            print(f"Compacted result store: {len(all_kept)} searches, {len(written)} articles rewritten")
+            return True
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # --- Views ---
+
+    def _write_views(self, keyword, timestamp, articles, folder):
+        # Imported here to avoid a circular import (news_utils writes into the store)
+        from news_utils import save_initial_articles_to_csv, save_news_to_txt
+
+        csv_path = save_initial_articles_to_csv(articles, keyword, timestamp, folder=folder, suffix="_filtered")
+        txt_path = save_news_to_txt(articles, keyword, timestamp, folder=folder, suffix="_filtered")
+        return csv_path, txt_path
+
+    def _remove_views(self, keyword, timestamp, folder):
+        safe_keywords = keyword.replace(' ', '_')
+        for extension in ("csv", "txt"):
+            self._remove_file(os.path.join(folder, f"{timestamp}_{safe_keywords}_filtered.{extension}"))
+
+    def write_search_views(self, search_id, folder=None):
+        """
+        (Re)write the per-search CSV and TXT files of a stored search (default: views_folder).
+        Returns (csv_path, txt_path) or (None, None) if the search is unknown.
+        """
+        search, articles = self.get_search(search_id)
+        if search is None:
+            print(f"Search '{search_id}' not found in result store")
+            return None, None
+        return self._write_views(search["keyword"], search["timestamp"], articles, folder or self.views_folder or "result")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """
+    Shared store instance for the process
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResultStore()
+        return _default_store
+
+
+if __name__ == "__main__":
+    # Usage: python result_store.py list | export SEARCH_ID [FOLDER] | compact
+    store = get_result_store()
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        for s in store.list_searches():
+            print(f"{s['search_id']}\t{s['count']} articles")
+    elif command == "export" and len(sys.argv) > 2:
+        store.write_search_views(sys.argv[2], *sys.argv[3:4])
+    elif command == "compact":
+        store.compact()
+    else:
+        print("Usage: python result_store.py list | export SEARCH_ID [FOLDER] | compact")
@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime
+
+from config import get_config
+
+# Seconds between two stack samples
+PROFILE_INTERVAL = float(get_config("PROFILE_INTERVAL", 0.005))
+PROFILE_FOLDER = get_config("PROFILE_FOLDER", "profiles")
+# Saved profiles kept on disk: the newest PROFILE_MAX_FILES, none older than PROFILE_MAX_AGE_DAYS
+PROFILE_MAX_FILES = int(get_config("PROFILE_MAX_FILES", 50))
+PROFILE_MAX_AGE_DAYS = float(get_config("PROFILE_MAX_AGE_DAYS", 7))
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the thread that enters it, every PROFILE_INTERVAL seconds.
+    Stacks are cut at the frame that entered the profiler and counted in the folded format
+    ("outer;inner;leaf count") read by flamegraph.pl, speedscope, etc.
+    Network time shows up under hedged_get, as time the search thread spends waiting: the requests
+    themselves run on the http_client pool threads, which are not sampled.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._root = sys._getframe(1)
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="search-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        return False
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None and frame is not self._root:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def build_profile_artifact(profiler, search_params):
+    """
+    Zip the folded stacks (profile.folded) with the search parameters (search.json).
+    Returns (file name, zip bytes).
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    metadata = {
+        "search": search_params,
+        "profiled_at": timestamp,
+        "duration_seconds": round(profiler.duration, 3),
+        "samples": profiler.samples,
+        "interval_seconds": profiler.interval
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("profile.folded", profiler.folded())
+        archive.writestr("search.json", json.dumps(metadata, indent=2, default=str))
+    return f"profile_{timestamp}.zip", buffer.getvalue()
+
+
+def prune_profiles(folder=PROFILE_FOLDER, max_files=PROFILE_MAX_FILES, max_age_days=PROFILE_MAX_AGE_DAYS):
+    """
+    Delete saved profiles beyond the newest max_files, or older than max_age_days
+    """
+    try:
+        paths = [os.path.join(folder, name) for name in os.listdir(folder) if name.startswith("profile_") and name.endswith(".zip")]
+    except FileNotFoundError:
+        return
+    paths.sort(key=os.path.getmtime, reverse=True)
+    min_mtime = time.time() - max_age_days * 86400
+    for i, path in enumerate(paths):
+        if i >= max_files or os.path.getmtime(path) < min_mtime:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def save_profile_artifact(name, data, folder=PROFILE_FOLDER):
+    """
+    Keep a copy of the profile artifact on disk (older copies are pruned). Returns the path or None on error.
+    """
+    try:
+        os.makedirs(folder, exist_ok=True)
+        filepath = os.path.join(folder, name)
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        print(f"Saved search profile to {filepath}")
+        prune_profiles(folder)
+        return filepath
+    except Exception as e:
+        print(f"Error saving search profile: {e}")
+        return None
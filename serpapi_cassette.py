@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+from config import get_config
+
+# "live" (default), "record" (live + save responses) or "replay" (serve saved responses only)
+SERPAPI_MODE = str(get_config("SERPAPI_MODE", "live")).lower()
+SERPAPI_CASSETTE = get_config("SERPAPI_CASSETTE", os.path.join("cassettes", "serpapi.jsonl.gz"))
+# Replayed responses wait for the recorded latency times this factor (0 = no wait)
+SERPAPI_REPLAY_LATENCY_SCALE = float(get_config("SERPAPI_REPLAY_LATENCY_SCALE", 1.0))
+# Set to "1" to replay a request recorded with other dates when there is no exact match
+# (preset windows end today, so a cassette recorded yesterday has no exact match for them)
+SERPAPI_REPLAY_IGNORE_DATES = str(get_config("SERPAPI_REPLAY_IGNORE_DATES", "0")) == "1"
+
+REDACTED = "REDACTED"
+
+
+def request_key(url, params, ignore_dates=False):
+    """
+    Stable key of a request, ignoring the API key (and the cd_min/cd_max dates of tbs if ignore_dates)
+    """
+    public_params = {k: v for k, v in params.items() if k != "api_key"}
+    if ignore_dates and "tbs" in public_params:
+        public_params["tbs"] = ",".join(
+            part for part in str(public_params["tbs"]).split(",")
+            if not part.startswith(("cd_min:", "cd_max:"))
+        )
+    payload = json.dumps([url, public_params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def build_response(url, status_code, content):
+    """
+    Build a requests.Response from a saved status code and body (bytes)
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+class Cassette:
+    """
+    Gzip-compressed JSON lines file of recorded SerpAPI interactions.
+
+    Each line holds the request key, the request params (API key redacted), the response status,
+    body and latency. Recording appends a gzip member per interaction; replay loads the file once
+    into memory and serves the latest interaction for each key. Once loaded, replay reads the
+    in-memory index without locking.
+    """
+
+    def __init__(self, path=SERPAPI_CASSETTE, latency_scale=SERPAPI_REPLAY_LATENCY_SCALE,
+                 ignore_dates=SERPAPI_REPLAY_IGNORE_DATES):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.ignore_dates = ignore_dates
+        self._lock = threading.Lock()
+        self._interactions = None
+        self._interactions_by_query = None
+
+    def record(self, url, params, response, latency):
+        api_key = params.get("api_key")
+        body = response.content.decode("utf-8", errors="replace")
+        if api_key:
+            body = body.replace(str(api_key), REDACTED)
+        interaction = {
+            "key": request_key(url, params),
+            "url": url,
+            "params": {k: (REDACTED if k == "api_key" else v) for k, v in params.items()},
+            "status_code": response.status_code,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+            "body": body
+        }
+        line = json.dumps(interaction, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(line)
+            if self._interactions is not None:
+                self._interactions[interaction["key"]] = interaction
+                self._interactions_by_query[request_key(url, params, ignore_dates=True)] = interaction
+
+    def _load(self):
+        # Fast path: the cassette is only read from disk once
+        interactions = self._interactions
+        if interactions is not None:
+            return interactions
+        with self._lock:
+            if self._interactions is None:
+                interactions = {}
+                interactions_by_query = {}
+                try:
+                    with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                interaction = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            interactions[interaction["key"]] = interaction
+                            interactions_by_query[request_key(interaction["url"], interaction["params"], ignore_dates=True)] = interaction
+                except FileNotFoundError:
+                    print(f"Cassette '{self.path}' not found, nothing to replay")
+                # Set last: the fast path above doesn't take the lock
+                self._interactions_by_query = interactions_by_query
+                self._interactions = interactions
+                print(f"Loaded {len(interactions)} recorded SerpAPI responses from {self.path}")
+            return self._interactions
+
+    def replay(self, url, params, timeout=None):
+        """
+        Returns the recorded requests.Response for a request, after its (scaled) recorded latency.
+        With ignore_dates, a request recorded for another date range matches when there is no exact match.
+        Raises requests.exceptions.ConnectionError if the request was never recorded.
+        """
+        interaction = self._load().get(request_key(url, params))
+        if interaction is None and self.ignore_dates:
+            interaction = self._interactions_by_query.get(request_key(url, params, ignore_dates=True))
+        if interaction is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for query {params.get('q', '')!r}")
+
+        delay = interaction["latency"] * self.latency_scale
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.Timeout(f"Replayed response slower than timeout ({timeout:.1f}s)")
+        if delay > 0:
+            time.sleep(delay)
+
+        return build_response(url, interaction["status_code"], interaction["body"].encode("utf-8"))
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Shared cassette instance for the process
+    """
+    global _cassette
+    if _cassette is not None:
+        return _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+        return _cassette
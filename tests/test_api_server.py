@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import api_server
+
+
+def run_with_client(monkeypatch, fake_search, test):
+    monkeypatch.setattr(api_server, "search_news_for_keywords", fake_search)
+    monkeypatch.setattr(api_server, "read_media_list", lambda filename: set())
+
+    async def main():
+        client = TestClient(TestServer(api_server.create_app()))
+        await client.start_server()
+        try:
+            await test(client)
+        finally:
+            await client.close()
+
+    asyncio.run(main())
+
+
+async def wait_for_pending(client, expected):
+    for _ in range(200):
+        if client.app["search_slots"]["pending"] == expected:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"pending is {client.app['search_slots']['pending']}, expected {expected}")
+
+
+def test_search_rejected_when_pending_is_full(monkeypatch):
+    monkeypatch.setattr(api_server, "API_MAX_PENDING", 1)
+    release = threading.Event()
+
+    def fake_search(api_key, keywords_list, **kwargs):
+        release.wait(5)
+        return [{"title": "SOSV news"}], True
+
+    async def test(client):
+        first = asyncio.ensure_future(client.get("/search", params={"keywords": "SOSV"}))
+        await wait_for_pending(client, 1)
+
+        response = await client.get("/search", params={"keywords": "HAX"})
+        assert response.status == 503
+        assert response.headers["Retry-After"] == "5"
+
+        release.set()
+        response = await first
+        assert response.status == 200
+        body = await response.json()
+        assert body["complete"] is True
+        assert body["count"] == 1
+        await wait_for_pending(client, 0)
+
+    run_with_client(monkeypatch, fake_search, test)
+
+
+def test_search_timeout_keeps_slot_until_thread_finishes(monkeypatch):
+    monkeypatch.setattr(api_server, "API_REQUEST_TIMEOUT", 0.2)
+    release = threading.Event()
+
+    def fake_search(api_key, keywords_list, **kwargs):
+        release.wait(5)
+        return [], True
+
+    async def test(client):
+        response = await client.get("/search", params={"keywords": "SOSV"})
+        assert response.status == 504
+        # The worker thread is still running the search
+        assert client.app["search_slots"]["pending"] == 1
+        release.set()
+        await wait_for_pending(client, 0)
+
+    run_with_client(monkeypatch, fake_search, test)
+
+
+def test_search_bad_requests(monkeypatch):
+    def fake_search(api_key, keywords_list, **kwargs):
+        raise ValueError("Invalid start date")
+
+    async def test(client):
+        response = await client.get("/search")
+        assert response.status == 400
+        response = await client.get("/search", params={"keywords": "SOSV", "num_results": "many"})
+        assert response.status == 400
+        response = await client.get("/export", params={"keywords": "SOSV", "format": "pdf"})
+        assert response.status == 400
+        response = await client.get("/search", params={"keywords": "SOSV", "start_date": "yesterday"})
+        assert response.status == 400
+        assert "Invalid start date" in await response.text()
+        await wait_for_pending(client, 0)
+
+    run_with_client(monkeypatch, fake_search, test)
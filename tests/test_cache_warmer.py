@@ -0,0 +1,37 @@
+import cache_warmer
+import http_client
+from http_client import ResponseCache
+from serpapi_cassette import build_response
+
+URL = "https://serpapi.com/search"
+
+
+def test_response_cache_shared_between_processes(tmp_path):
+    shared_path = str(tmp_path / "response_cache.jsonl.gz")
+    warmer_cache = ResponseCache(ttl=3600, shared_path=shared_path)
+    warmer_cache.put("fresh", build_response(URL, 200, b'{"news_results": []}'))
+    warmer_cache.put("expired", build_response(URL, 200, b'{}'))
+    warmer_cache._entries["expired"]["stored_at"] -= 7200
+    assert warmer_cache.save_shared() == 1
+
+    api_cache = ResponseCache(ttl=3600, shared_path=shared_path)
+    assert api_cache.get("fresh")["content"] == b'{"news_results": []}'
+    assert api_cache.get("expired") is None
+
+
+def test_warm_cache_budget_counts_requests_sent(tmp_path, monkeypatch):
+    searches = []
+
+    def fake_search(api_key, keywords_list, **kwargs):
+        searches.append(kwargs["start_date_str"])
+        # The combined query returned a full page: both keywords were queried again
+        http_client._thread_stats.requests_sent = http_client.requests_sent() + 3
+        return [], True
+
+    monkeypatch.setattr(cache_warmer, "top_queries", lambda: [(["SOSV", "HAX"], 20)])
+    monkeypatch.setattr(cache_warmer, "plan_search", lambda *args: [["SOSV", "HAX"]])
+    monkeypatch.setattr(cache_warmer, "search_news_for_keywords", fake_search)
+    monkeypatch.setattr(cache_warmer, "response_cache", ResponseCache(ttl=3600, shared_path=str(tmp_path / "cache.jsonl.gz")))
+
+    assert cache_warmer.warm_cache("key", set(), max_calls=7) == 6
+    assert len(searches) == 2
@@ -0,0 +1,31 @@
+import news_utils
+from query_planner import MAX_COMBINED_RESULTS
+
+
+def test_fetch_keyword_batch_falls_back_to_single_queries_on_full_page(monkeypatch):
+    calls = []
+
+    def fake_get_news(api_key, query, num_results=10, **kwargs):
+        calls.append((query, num_results))
+        if query.startswith("("):
+            page = [{"title": f"SOSV news {i}"} for i in range(MAX_COMBINED_RESULTS)]
+        else:
+            page = [{"title": f"{query} news"}]
+        return page, page
+
+    monkeypatch.setattr(news_utils, "get_news_by_keywords", fake_get_news)
+    results = news_utils.fetch_keyword_batch("key", ["SOSV", "HAX"], num_results=20)
+
+    assert calls == [('("SOSV" OR "HAX")', MAX_COMBINED_RESULTS), ("SOSV", 20), ("HAX", 20)]
+    assert results["SOSV"] == {"articles": [{"title": "SOSV news"}], "raw_count": 1, "failed": False}
+    assert results["HAX"] == {"articles": [{"title": "HAX news"}], "raw_count": 1, "failed": False}
+
+
+def test_fetch_keyword_batch_attributes_combined_results(monkeypatch):
+    page = [{"title": "SOSV invests"}, {"title": "HAX demo day"}, {"title": "Other news"}]
+    monkeypatch.setattr(news_utils, "get_news_by_keywords", lambda *args, **kwargs: (page, page))
+    results = news_utils.fetch_keyword_batch("key", ["SOSV", "HAX"], num_results=20)
+
+    assert results["SOSV"]["articles"] == [page[0]]
+    assert results["HAX"]["articles"] == [page[1]]
+    assert results["HAX"]["raw_count"] == 1
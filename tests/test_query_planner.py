@@ -0,0 +1,88 @@
+from query_planner import (
+    MAX_COMBINED_RESULTS,
+    MAX_QUERY_LENGTH,
+    attribute_articles,
+    build_combined_query,
+    estimate_keyword_volume,
+    keyword_matches,
+    plan_queries,
+    window_days
+)
+
+
+def test_keyword_matches_whole_words_only():
+    assert not keyword_matches("AI", "Brain implants said to rise")
+    assert not keyword_matches("Ola", "Coca-Cola earnings beat")
+    assert keyword_matches("AI", "AI startups raise record funding")
+    assert keyword_matches("Ola", "Ola Electric files for IPO")
+
+
+def test_keyword_matches_phrase_and_words():
+    assert keyword_matches("Climate Tech", "The climate tech boom")
+    assert keyword_matches("Climate Tech", "Tech investors bet on climate")
+    assert not keyword_matches("Climate Tech", "Climate summit opens")
+    assert keyword_matches("C++", "Why C++ still matters")
+
+
+def test_attribute_articles():
+    news_list = [{"title": "SOSV backs HAX startup"}, {"title": "Brain research update"}]
+    attributed, unmatched = attribute_articles(news_list, ["SOSV", "HAX", "AI"])
+    assert attributed["SOSV"] == [news_list[0]]
+    assert attributed["HAX"] == [news_list[0]]
+    assert attributed["AI"] == []
+    assert unmatched == [news_list[1]]
+
+
+def test_window_days():
+    assert window_days("2025-01-01", "2025-01-31") == 31
+    assert window_days("2025-01-01", "2025-01-01") == 1
+    assert window_days(None, "2025-01-31") == 183
+
+
+def test_estimate_keyword_volume_full_page_is_unknown():
+    recent = [{"raw_count": 20, "num_results": 20, "window_days": 30}]
+    assert estimate_keyword_volume(recent, 20, 30) is None
+
+
+def test_estimate_keyword_volume_scales_with_window():
+    recent = [{"raw_count": 10, "count": 2, "num_results": 20, "window_days": 30}]
+    assert estimate_keyword_volume(recent, 20, 30) == 10
+    assert estimate_keyword_volume(recent, 20, 7) == 3
+    # Capped at the page size
+    assert estimate_keyword_volume(recent, 20, 365) == 20
+    # Without history the keyword is assumed to fill its page
+    assert estimate_keyword_volume([], 20, 30) == 20
+
+
+def test_plan_queries_high_volume_keywords_alone():
+    estimates = {"SOSV": None, "HAX": 20, "IndieBio": 5, "Orbit": 3}
+    plan = plan_queries(["SOSV", "HAX", "IndieBio", "Orbit"], 20, estimates)
+    assert plan == [["SOSV"], ["HAX"], ["IndieBio", "Orbit"]]
+
+
+def test_plan_queries_packs_within_max_combined_results():
+    keywords = [f"kw{i}" for i in range(10)]
+    estimates = {kw: 15 for kw in keywords}
+    plan = plan_queries(keywords, 20, estimates)
+    for batch in plan:
+        assert sum(estimates[kw] for kw in batch) <= MAX_COMBINED_RESULTS
+    assert len(plan) == 2
+    # Every keyword is planned once, in the user's order
+    assert [kw for batch in plan for kw in batch] == keywords
+
+
+def test_plan_queries_packs_within_max_query_length():
+    keywords = [f"{i:03d}" + "x" * 96 for i in range(10)]
+    estimates = {kw: 1 for kw in keywords}
+    site_query_length = MAX_QUERY_LENGTH - 500
+    plan = plan_queries(keywords, 20, estimates, site_query_length)
+    assert len(plan) > 1
+    for batch in plan:
+        assert len(build_combined_query(batch)) + site_query_length <= MAX_QUERY_LENGTH
+
+
+def test_plan_queries_keeps_keyword_order():
+    keywords = ["Orbit", "SOSV", "IndieBio", "HAX"]
+    estimates = {"Orbit": 1, "SOSV": None, "IndieBio": 30, "HAX": 50}
+    plan = plan_queries(keywords, 100, estimates)
+    assert plan == [["Orbit", "IndieBio", "HAX"], ["SOSV"]]
@@ -0,0 +1,125 @@
+import os
+
+import result_store
+from result_store import ResultStore
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault("views_folder", "")
+    kwargs.setdefault("max_total_bytes", 0)
+    return ResultStore(str(tmp_path / "store"), **kwargs)
+
+
+def wait_for_compaction(store):
+    if store._compaction_thread is not None:
+        store._compaction_thread.join(5)
+
+
+def stored_article_ids(store):
+    return [r["id"] for r in store.iter_records() if r.get("type") == "article"]
+
+
+def test_identical_articles_are_stored_once(tmp_path):
+    store = make_store(tmp_path)
+    shared = {"title": "SOSV and HAX news"}
+    sosv_id = store.append_search("SOSV", [shared, {"title": "SOSV news"}], timestamp="20250101_000000")
+    hax_id = store.append_search("HAX", [shared], timestamp="20250101_000000")
+
+    assert len(stored_article_ids(store)) == 2
+    assert store.get_search(sosv_id)[1] == [shared, {"title": "SOSV news"}]
+    assert store.get_search(hax_id)[1] == [shared]
+
+
+def test_reopened_store_keeps_searches(tmp_path):
+    store = make_store(tmp_path, segment_max_bytes=100)
+    for i in range(5):
+        store.append_search("SOSV", [{"title": f"SOSV news {i}"}], timestamp=f"2025010{i + 1}_000000", meta={"num_results": 20})
+    store.compact()
+
+    reopened = make_store(tmp_path, segment_max_bytes=100)
+    assert len(reopened.list_searches()) == 5
+    recent = reopened.recent_searches("sosv")
+    assert [s["timestamp"] for s in recent] == [f"2025010{i + 1}_000000" for i in range(5)]
+    assert recent[-1]["num_results"] == 20
+
+    reopened.append_search("SOSV", [{"title": "SOSV news 0"}], timestamp="20250106_000000")
+    assert len(stored_article_ids(make_store(tmp_path))) == 5
+
+
+def test_age_retention_drops_old_searches_and_views(tmp_path, monkeypatch):
+    now = [1_000_000_000.0]
+    monkeypatch.setattr(result_store.time, "time", lambda: now[0])
+    views_folder = str(tmp_path / "views")
+    store = make_store(tmp_path, max_age_days=1, views_folder=views_folder)
+
+    store.append_search("SOSV", [{"title": "SOSV news"}], timestamp="20250101_000000")
+    assert sorted(os.listdir(views_folder)) == ["20250101_000000_SOSV_filtered.csv", "20250101_000000_SOSV_filtered.txt"]
+
+    now[0] += 2 * 86400
+    store.append_search("HAX", [{"title": "HAX news"}], timestamp="20250103_000000")
+    wait_for_compaction(store)
+
+    assert [s["keyword"] for s in store.list_searches()] == ["HAX"]
+    assert len(stored_article_ids(store)) == 1
+    assert sorted(os.listdir(views_folder)) == ["20250103_000000_HAX_filtered.csv", "20250103_000000_HAX_filtered.txt"]
+    assert store.recent_searches("SOSV") == []
+
+
+def test_size_retention_keeps_newest_searches_within_limit(tmp_path):
+    views_folder = str(tmp_path / "views")
+    store = make_store(tmp_path, max_total_bytes=4000, views_folder=views_folder)
+    for i in range(20):
+        store.append_search("SOSV", [{"title": f"SOSV news {i} " + "x" * 100}], timestamp=f"202501{i + 1:02d}_000000")
+        wait_for_compaction(store)
+
+    searches = store.list_searches()
+    assert 0 < len(searches) < 20
+    assert searches[-1]["timestamp"] == "20250120_000000"
+    # Views count towards the limit and are removed with their search
+    assert store._total_bytes() <= 4000
+    assert len(os.listdir(views_folder)) == 2 * len(searches)
+    segment_names = set(s["name"] for s in store.manifest["segments"])
+    assert set(n for n in os.listdir(store.folder) if n.startswith("segment_")) == segment_names
+
+
+def test_stores_shared_by_two_processes(tmp_path):
+    app_store = make_store(tmp_path)
+    api_store = make_store(tmp_path)
+    assert api_store.recent_searches("HAX") == []
+
+    app_store.append_search("SOSV", [{"title": "SOSV news"}], timestamp="20250101_000000")
+    api_store.compact()
+    app_store.append_search("HAX", [{"title": "HAX news"}], timestamp="20250102_000000")
+
+    keywords = [s["keyword"] for s in make_store(tmp_path).list_searches()]
+    assert keywords == ["SOSV", "HAX"]
+    # The API's index is refreshed after the app's append
+    assert [s["keyword"] for s in api_store.recent_searches("HAX")] == ["HAX"]
+
+
+def test_search_appended_during_compaction_keeps_its_articles(tmp_path, monkeypatch):
+    now = [1_000_000_000.0]
+    monkeypatch.setattr(result_store.time, "time", lambda: now[0])
+    store = make_store(tmp_path, max_age_days=1)
+    # No retention in the other process, so that only this compaction runs
+    other = make_store(tmp_path, max_age_days=0)
+    old_article = {"title": "SOSV news"}
+    store.append_search("SOSV", [old_article], timestamp="20250101_000000")
+    now[0] += 2 * 86400
+
+    # The other process appends a search reusing the (expiring) article while the segments are rewritten
+    iter_segment = ResultStore._iter_segment
+    appended = []
+
+    def iter_segment_then_append(self, name):
+        yield from iter_segment(self, name)
+        if self is store and not appended:
+            appended.append(other.append_search("HAX", [old_article], timestamp="20250103_000000"))
+
+    monkeypatch.setattr(ResultStore, "_iter_segment", iter_segment_then_append)
+    assert store.compact()
+    monkeypatch.setattr(ResultStore, "_iter_segment", iter_segment)
+
+    reopened = make_store(tmp_path, max_age_days=1)
+    assert [s["keyword"] for s in reopened.list_searches()] == ["HAX"]
+    assert reopened.get_search("20250103_000000_HAX")[1] == [old_article]
@@ -0,0 +1,47 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+from serpapi_cassette import REDACTED, Cassette, build_response
+
+URL = "https://serpapi.com/search"
+
+
+def make_params(api_key="secret-key", tbs="cdr:1,cd_min:01/01/2025,cd_max:01/31/2025"):
+    return {"engine": "google", "q": "SOSV", "tbm": "nws", "tbs": tbs, "api_key": api_key}
+
+
+def test_record_redacts_api_key_in_params_and_body(tmp_path):
+    path = str(tmp_path / "serpapi.jsonl.gz")
+    cassette = Cassette(path, latency_scale=0)
+    body = json.dumps({"search_metadata": {"json_endpoint": "https://serpapi.com/searches/x.json?api_key=secret-key"}})
+    cassette.record(URL, make_params(), build_response(URL, 200, body.encode("utf-8")), 0.2)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    assert "secret-key" not in content
+    interaction = json.loads(content)
+    assert interaction["params"]["api_key"] == REDACTED
+    assert REDACTED in interaction["body"]
+
+    # Replayed with any API key
+    response = Cassette(path, latency_scale=0).replay(URL, make_params(api_key="other-key"))
+    assert response.status_code == 200
+    assert "secret-key" not in response.text
+
+
+def test_replay_ignore_dates_fallback(tmp_path):
+    path = str(tmp_path / "serpapi.jsonl.gz")
+    Cassette(path, latency_scale=0).record(URL, make_params(), build_response(URL, 200, b'{"news_results": []}'), 0.2)
+    other_dates = make_params(tbs="cdr:1,cd_min:02/01/2025,cd_max:02/28/2025")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        Cassette(path, latency_scale=0).replay(URL, other_dates)
+
+    response = Cassette(path, latency_scale=0, ignore_dates=True).replay(URL, other_dates)
+    assert response.json() == {"news_results": []}
+    # Other queries still don't match
+    with pytest.raises(requests.exceptions.ConnectionError):
+        Cassette(path, latency_scale=0, ignore_dates=True).replay(URL, dict(other_dates, q="HAX"))